@@ -126,7 +126,8 @@ class AgentASK[InputT: AgentType, OutputT: AgentType]:
                         usage = RunUsage()
                         usage.requests = 1  # Simulate one request
                         self._stat._update_stats(usage, duration=0.001)
-                        return self._convert_output(output)
+                        # cached outputs were stored after conversion
+                        return output
 
                     return set_output(await self._agent_run(prompt))
             else:
@@ -146,6 +147,7 @@ class AgentASK[InputT: AgentType, OutputT: AgentType]:
 
     def cache(self, cache: CacheASK) -> "AgentASK[InputT, OutputT]":
         """Cache the agent's execution results."""
+        cache.register_agent(self._name, self._output_type)
         self._cache = cache
         return self
 
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
+import copy
+import functools
 import hashlib
 import json
+import os
 import sqlite3
-from collections.abc import AsyncIterator, Callable
-from contextlib import asynccontextmanager
+import tempfile
+import time
+from collections.abc import Callable, Mapping
 from pathlib import Path
 from typing import (
     Any,
@@ -13,7 +19,15 @@ from typing import (
 )
 
 import yaml
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+# libyaml-backed loader and dumper when PyYAML was built with it
+try:
+    from yaml import CSafeDumper as _SafeDumper
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeDumper as _SafeDumper
+    from yaml import SafeLoader as _SafeLoader
 
 
 @runtime_checkable
@@ -22,7 +36,8 @@ class CacheStore(Protocol):
     Interface for a simple key-value cache store used by CacheASK.
 
     Implementations must be persistent or in-memory key-value stores
-    that support basic get/set and cleanup operations.
+    that support basic get/set and cleanup operations. Stores that buffer
+    writes may also define flush(); CacheASK calls it when present.
     """
 
     def get(self, key: str) -> Any | None:
@@ -38,30 +53,122 @@ class CacheStore(Protocol):
         ...
 
 
+# Stores holding unflushed writes. The strong references keep such a store
+# alive until it flushes, at the latest at interpreter exit.
+_dirty_stores: set[CacheStoreYaml | CacheStoreSQLite] = set()
+
+
+@atexit.register
+def _flush_dirty_stores() -> None:
+    for store in list(_dirty_stores):
+        # one failing store must not keep the others from being flushed
+        try:
+            store.flush()
+        except Exception:
+            _dirty_stores.discard(store)
+
+
+@functools.lru_cache(maxsize=128)
+def _read_yaml_journal(
+    path: Path, mtime_ns: int, size: int
+) -> tuple[dict[str, Any], int, bool]:
+    """Merge a YAML journal; keyed by stat so a changed file is read again.
+
+    Returns the merged entries, the number of entries in the log, and whether
+    reading stopped at a damaged document.
+    """
+    data: dict[str, Any] = {}
+    entries = 0
+    with open(path) as f:
+        try:
+            for doc in yaml.load_all(f, Loader=_SafeLoader):
+                if isinstance(doc, dict):
+                    data.update(doc)
+                    entries += len(doc)
+        except yaml.YAMLError:
+            return data, entries, True
+    return data, entries, False
+
+
 class CacheStoreYaml(CacheStore):
     """
     YAML file-backed implementation of CacheStore for caching
     executor/agent step inputs and outputs.
+
+    Writes are rendered to YAML when set, buffered until flush() and then
+    appended to the file as one YAML document, so a flush costs only the
+    changed entries. The file is
+    compacted back into a single document once it holds more than twice as
+    many entries as live keys.
+
+    The file is parsed on first use rather than on construction, so creating
+    a store that is never read costs nothing.
     """
 
     def __init__(self, path: str | Path = ".ask_cache.yaml"):
         self.path = Path(path).expanduser().resolve()
-        self._data = self._load()
+        self._log_entries = 0
+        self._compact_pending = False
+        # rendered "key: value" lines of the unflushed writes
+        self._dirty: dict[str, str] = {}
+
+    @functools.cached_property
+    def _data(self) -> dict[str, Any]:
+        return self._load()
+
+    def __enter__(self) -> CacheStoreYaml:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Flush the writes made inside the block."""
+        self.flush()
 
     def _load(self) -> dict[str, Any]:
-        if not self.path.exists():
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
             return {}
-        with open(self.path) as f:
-            try:
-                data = yaml.safe_load(f)
-                return data if isinstance(data, dict) else {}
-            except yaml.YAMLError:
-                # Handle empty or invalid YAML file
-                return {}
+        data, self._log_entries, damaged = _read_yaml_journal(
+            self.path, stat.st_mtime_ns, stat.st_size
+        )
+        # Handle invalid YAML: keep the entries read before the damage
+        # and rewrite the file on the next write instead of appending
+        self._compact_pending = damaged
+        # deep copy: the cached entries are shared by every store reading
+        # this file, and values may be nested lists and dicts
+        return copy.deepcopy(data)
 
     def _save(self):
-        with open(self.path, "w") as f:
-            yaml.dump(self._data, f, default_flow_style=False)
+        # write beside the file and swap it in, so a failed dump during
+        # compaction leaves the old file in place rather than an empty one
+        fd, tmp = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                yaml.dump(self._data, f, Dumper=_SafeDumper, default_flow_style=False)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._log_entries = len(self._data)
+        self._compact_pending = False
+
+    def _append(self, lines: Mapping[str, str]):
+        # size the log only after the file has been read
+        live = len(self._data)
+        if self._compact_pending or self._log_entries + len(lines) > 2 * live:
+            self._save()
+            return
+        with open(self.path, "a") as f:
+            f.write("---\n")
+            f.writelines(lines.values())
+        self._log_entries += len(lines)
+
+    @staticmethod
+    def _render(key: str, value: Any) -> str:
+        # fails here, at the write, for values YAML cannot represent
+        return yaml.dump({key: value}, Dumper=_SafeDumper, default_flow_style=False)
 
     def get(self, key: str) -> Any | None:
         """
@@ -71,16 +178,39 @@ class CacheStoreYaml(CacheStore):
 
     def set(self, key: str, value: Any):
         """
-        Store key and value.
+        Store key and value. The write is persisted on the next flush.
         """
+        self._dirty[key] = self._render(key, value)
         self._data[key] = value
-        self._save()
+        _dirty_stores.add(self)
+
+    def set_many(self, items: Mapping[str, Any]):
+        """
+        Store several keys and values. They are persisted on the next flush.
+        """
+        lines = {key: self._render(key, value) for key, value in items.items()}
+        self._dirty.update(lines)
+        self._data.update(items)
+        _dirty_stores.add(self)
+
+    def flush(self):
+        """
+        Append the buffered writes to the state file.
+        """
+        if self._dirty:
+            self._append(self._dirty)
+            self._dirty = {}
+        _dirty_stores.discard(self)
 
     def clean(self):
         """
         Clear the storage by deleting the state file and clearing the in-memory data.
         """
-        self._data.clear()
+        self._data = {}
+        self._dirty.clear()
+        _dirty_stores.discard(self)
+        self._log_entries = 0
+        self._compact_pending = False
         if self.path.exists():
             self.path.unlink()
 
@@ -154,12 +284,31 @@ class CacheStoreSQLite(CacheStore):
     """
     SQLite file-backed implementation of CacheStore for caching
     executor/agent step inputs and outputs.
+
+    Writes are serialized to JSON when set, buffered until flush() and then
+    committed in one transaction.
     """
 
-    def __init__(self, path: str | Path = ".ask_cache.db"):
+    # Statements run by get() and flush()
+    _GET_SQL = "SELECT value FROM cache WHERE key = ?"
+    _SET_SQL = "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)"
+
+    def __init__(self, path: str | Path = ".ask_cache.db", network_fs: bool = False):
         self.path = Path(path).expanduser().resolve()
         self._conn = sqlite3.connect(str(self.path))
+        self._configure(network_fs)
         self._create_table()
+        # JSON text of the unflushed writes
+        self._dirty: dict[str, str] = {}
+
+    def _configure(self, network_fs: bool):
+        # WAL needs shared memory, which network filesystems do not provide
+        journal_mode = "DELETE" if network_fs else "WAL"
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        # A lost write after a power failure only costs a cache miss
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA mmap_size=268435456")
 
     def _create_table(self):
         self._conn.execute(
@@ -171,77 +320,218 @@ class CacheStoreSQLite(CacheStore):
         """
         Get value by key. Returns None if key does not exist.
         """
-        cursor = self._conn.cursor()
-        cursor.execute("SELECT value FROM cache WHERE key = ?", (key,))
-        row = cursor.fetchone()
-        if row:
-            try:
-                return json.loads(row[0])
-            except json.JSONDecodeError:
+        value = self._dirty.get(key)
+        if value is None:
+            row = self._conn.execute(self._GET_SQL, (key,)).fetchone()
+            if not row:
                 return None
-        return None
+            value = row[0]
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return None
 
     def set(self, key: str, value: Any) -> None:
         """
-        Store key and value.
+        Store key and value. The write is persisted on the next flush.
         """
-        serialized = json.dumps(value)
-        self._conn.execute(
-            "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, serialized)
-        )
-        self._conn.commit()
+        self._dirty[key] = json.dumps(value)
+        _dirty_stores.add(self)
+
+    def set_many(self, items: Mapping[str, Any]) -> None:
+        """
+        Store several keys and values. They are persisted on the next flush,
+        together in one transaction.
+        """
+        self._dirty.update({key: json.dumps(value) for key, value in items.items()})
+        _dirty_stores.add(self)
+
+    def flush(self) -> None:
+        """
+        Write the buffered values in a single transaction.
+        """
+        if self._dirty:
+            with self._conn:
+                self._conn.executemany(self._SET_SQL, self._dirty.items())
+            self._dirty.clear()
+        _dirty_stores.discard(self)
 
     def clean(self) -> None:
         """
         Clear the storage by closing the connection and deleting the backing file.
         """
+        self._dirty.clear()
+        _dirty_stores.discard(self)
         self._conn.close()
         if self.path.exists():
             self.path.unlink()
 
 
+@functools.cache
+def _type_adapter(output_type: Any) -> TypeAdapter:
+    """Adapter for a non-model output type, built once per type."""
+    return TypeAdapter(output_type)
+
+
+def _decode_output[OutputT](output_type: type[OutputT], data: Any) -> OutputT | None:
+    """Rebuild a cached value as output_type; None if it no longer fits the type."""
+    if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+        try:
+            return output_type.model_validate(data)
+        except ValidationError:
+            return None
+    try:
+        return _type_adapter(output_type).validate_python(data)
+    except ValidationError:
+        return None
+
+
 class CacheASK:
-    def __init__(self, store: CacheStore | None = None):
+    def __init__(
+        self,
+        store: CacheStore | None = None,
+        flush_interval: float = 0.5,
+        flush_keys: int = 64,
+    ):
         self.store: CacheStore = store or CacheStoreYaml()
+        # Group commit: step outputs are flushed together once flush_keys are
+        # pending or flush_interval seconds have passed since the last flush
+        self._flush_interval = flush_interval
+        self._flush_keys = flush_keys
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._flush_loop: asyncio.AbstractEventLoop | None = None
+        # per-agent decoders bound once to the agent's output type
+        self._decoders: dict[str, Callable[[Any], Any]] = {}
+
+    def register_agent(self, name: str, output_type: type) -> None:
+        """
+        Decode cached outputs of agent name as output_type in every step.
+        """
+        self._decoders[name] = functools.partial(_decode_output, output_type)
+
+    def flush(self):
+        """
+        Persist all pending step outputs now.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        flush = getattr(self.store, "flush", None)
+        if flush is not None:
+            flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def _commit(self):
+        if not self._pending:
+            return
+        if (
+            self._pending >= self._flush_keys
+            or time.monotonic() - self._last_flush >= self._flush_interval
+        ):
+            self.flush()
+            return
+        loop = asyncio.get_running_loop()
+        timer = self._flush_timer
+        # a timer left on a loop that has closed since (one asyncio.run per
+        # call) never fires, so schedule a new one on the running loop
+        if timer is None or timer.cancelled() or self._flush_loop is not loop:
+            self._flush_loop = loop
+            self._flush_timer = loop.call_later(
+                self._flush_interval, self._on_flush_timer
+            )
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        self.flush()
 
     def _get_input_key(self, input_data: Any) -> str:
         """Create a consistent hash key from the input data."""
-        if isinstance(input_data, BaseModel):
-            serialized_input = json.dumps(input_data.model_dump(), sort_keys=True)
-        elif isinstance(input_data, str):
+        # str first: step keys are always strings
+        if isinstance(input_data, str):
             serialized_input = input_data
+        elif isinstance(input_data, BaseModel):
+            serialized_input = input_data.model_dump_json()
         else:
             try:
                 serialized_input = json.dumps(input_data, sort_keys=True)
             except TypeError:
                 serialized_input = str(input_data)
 
-        return hashlib.sha256(serialized_input.encode("utf-8")).hexdigest()
+        # keys only need to be collision-free, not cryptographically strong
+        digest = hashlib.blake2b(serialized_input.encode("utf-8"), digest_size=16)
+        return digest.hexdigest()
+
+    def _step_key(self, agent: str, input: Any) -> str:
+        """Key for an agent step; models are keyed by their JSON, not their repr."""
+        if isinstance(input, BaseModel):
+            input = input.model_dump_json()
+        return self._get_input_key(f"{agent}:{input}")
 
-    @asynccontextmanager
-    async def step[OutputT](
-        self, agent: str, input: Any
-    ) -> AsyncIterator[tuple[OutputT | None, Callable[[OutputT], Any]]]:
+    def step[OutputT](
+        self, agent: str, input: Any, output_type: type[OutputT] | None = None
+    ) -> _CacheStep[OutputT]:
         """
         Async context manager for executing a step.
-        """
-        key = self._get_input_key(f"{agent}:{input}")
-        output = self.store.get(key)
-
-        def set_output(x: OutputT) -> OutputT:
-            if isinstance(x, BaseModel):
-                self.store.set(key, x.model_dump())
-            else:
-                self.store.set(key, x)
-            return x
 
-        try:
-            yield (output, set_output)
-        finally:
-            pass
+        With output_type, or one registered for the agent with register_agent,
+        a cached pydantic model is yielded as a model instance, and an entry
+        that fails validation is treated as a cache miss.
+        """
+        if output_type is not None:
+            decode = functools.partial(_decode_output, output_type)
+        else:
+            decode = self._decoders.get(agent)
+        return _CacheStep(self, self._step_key(agent, input), decode)
 
     def clean(self):
         """
         Clean the executor's state store.
         """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._pending = 0
         self.store.clean()
+
+
+class _CacheStep[OutputT]:
+    """
+    Async context manager returned by CacheASK.step. A plain slotted class
+    rather than an asynccontextmanager generator, since steps are entered
+    once per agent run.
+    """
+
+    __slots__ = ("_cache", "_key", "_decode")
+
+    def __init__(
+        self,
+        cache: CacheASK,
+        key: str,
+        decode: Callable[[Any], OutputT | None] | None,
+    ) -> None:
+        self._cache = cache
+        self._key = key
+        self._decode = decode
+
+    async def __aenter__(
+        self,
+    ) -> tuple[OutputT | None, Callable[[OutputT], OutputT]]:
+        output = self._cache.store.get(self._key)
+        if output is not None and self._decode is not None:
+            output = self._decode(output)
+        return output, self.set_output
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self._cache._commit()
+
+    def set_output(self, x: OutputT) -> OutputT:
+        if isinstance(x, BaseModel):
+            # JSON mode: Enum, datetime and UUID fields become plain data
+            self._cache.store.set(self._key, x.model_dump(mode="json"))
+        else:
+            self._cache.store.set(self._key, x)
+        self._cache._pending += 1
+        return x
@@ -1,5 +1,7 @@
 import builtins
+import functools
 import os
+import sys
 import typing
 from enum import Enum
 from typing import Any, Literal
@@ -196,24 +198,58 @@ def _resolve_api_key(v):
     return v
 
 
+@functools.cache
+def _yaml_loader() -> type:
+    """Prefer the libyaml-backed safe loader; warn once when it is missing."""
+    loader = getattr(yaml, "CSafeLoader", None)
+    if loader is None:
+        print(
+            "Warning: libyaml is not available, using the slower YAML loader.",
+            file=sys.stderr,
+        )
+        return yaml.SafeLoader
+    return loader
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_config_file(path: str, mtime_ns: int, size: int) -> Any:
+    """Parse one YAML file; keyed by stat so an edited file is parsed again.
+
+    Only the raw data is cached: validation, including `env:` and `file:`
+    lookups, still runs on every `load_config` call.
+    """
+    # binary stream: the loader detects the encoding and reads in chunks itself
+    with open(path, "rb") as f:
+        return yaml.load(f, Loader=_yaml_loader())
+
+
+def _clear_config_cache() -> None:
+    """Drop all cached parsed config files."""
+    _parse_config_file.cache_clear()
+
+
 def load_config[Type](
     paths: list[str], type: type[Type] = Config, key: str | None = None
 ) -> Type:
     """Merge multiple YAML config files into a `Config`. Later files override."""
-    merged_raw: dict = {}
+    paths = [p for p in paths if p is not None]  # skip empty paths
+    # fail fast before parsing anything if any config file is missing
     for p in paths:
-        if p is None:  # skip empty paths
-            continue
+        if not os.path.isfile(os.path.expanduser(p)):
+            raise RuntimeError(f"Configuration file '{p}' not found.")
 
+    merged_raw: dict = {}
+    for p in paths:
         try:
-            with open(os.path.expanduser(p)) as f:
-                raw = yaml.safe_load(f)
-                if not isinstance(raw, dict):
-                    raise ValueError(
-                        f"Config file '{p}' must contain a dictionary at the root."
-                    )
-                # merge top level keys only
-                merged_raw = {**merged_raw, **raw}
+            path = os.path.abspath(os.path.expanduser(p))
+            st = os.stat(path)
+            raw = _parse_config_file(path, st.st_mtime_ns, st.st_size)
+            if not isinstance(raw, dict):
+                raise ValueError(
+                    f"Config file '{p}' must contain a dictionary at the root."
+                )
+            # merge top level keys only, in place; cached raw dicts are not touched
+            merged_raw.update(raw)
         except FileNotFoundError as e:
             raise RuntimeError(f"Configuration file '{p}' not found.") from e
         except yaml.YAMLError as e:
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import re
+
 from pydantic import BaseModel
 
+# optional ```json / ``` fence around the payload, matched in one pass
+_CODE_BLOCK_RE = re.compile(r"\A\s*(?:```(?:json)?)?(.*?)(?:```)?\s*\Z", re.DOTALL)
+
 
 # some utils for base models
 def example(model: BaseModel) -> str:
@@ -17,11 +22,5 @@ def schema(model: type[BaseModel]) -> dict:
 def load_string_json[Type: BaseModel](text: str, model: type[Type]) -> Type:
     """Load a pydantic model from a json string, stripping code block markers if present."""
     # strip ```json and ``` if present
-    text = text.strip()
-    if text.startswith("```json"):
-        text = text[len("```json") :]
-    elif text.startswith("```"):
-        text = text[len("```") :]
-    if text.endswith("```"):
-        text = text[: -len("```")]
+    text = _CODE_BLOCK_RE.match(text).group(1)
     return model.model_validate_json(text)
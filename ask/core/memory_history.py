@@ -1,4 +1,5 @@
 import sqlite3
+from collections.abc import Iterable
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Literal
@@ -30,16 +31,22 @@ class History:
         Initialize History with SQLite database.
 
         Args:
-            db_path: Path to the SQLite database file
+            db_path: Path to the SQLite database file, or a SQLite URI such as
+                "file:name?mode=memory&cache=shared"
             collection_name: Name of the table to store history entries
         """
-        self.db_path = Path(db_path)
+        self._uri = str(db_path).startswith("file:")
+        self.db_path = db_path if self._uri else Path(db_path)
         self.collection_name = collection_name
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the database path or URI."""
+        return sqlite3.connect(self.db_path, uri=self._uri)
+
     def _init_db(self) -> None:
         """Create the history table if it doesn't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS {self.collection_name} (
@@ -87,7 +94,7 @@ class History:
         if timestamp is None:
             timestamp = int(datetime.now().timestamp())
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 f"INSERT INTO {self.collection_name} (query, content, timestamp) VALUES (?, ?, ?)",
@@ -99,6 +106,24 @@ class History:
                 raise RuntimeError("Failed to get last row ID from database")
             return row_id
 
+    def add_history_many(self, entries: Iterable[tuple[str, str, int]]) -> int:
+        """
+        Add several history entries in a single transaction.
+
+        Args:
+            entries: (query, content, timestamp) tuples to insert
+
+        Returns:
+            Number of entries inserted
+        """
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                f"INSERT INTO {self.collection_name} (query, content, timestamp) VALUES (?, ?, ?)",
+                entries,
+            )
+            conn.commit()
+            return cursor.rowcount
+
     def get_page(
         self,
         page: int = 1,
@@ -143,7 +168,7 @@ class History:
             before = int(datetime.now().timestamp())
 
         offset = (page - 1) * page_size
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 f"""
@@ -179,7 +204,7 @@ class History:
         if before is None:
             before = int(datetime.now().timestamp())
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 f"SELECT COUNT(*) FROM {self.collection_name} WHERE timestamp <= ?",
@@ -199,7 +224,7 @@ class History:
             deleted_count = history.clear()
             print(f"Deleted {deleted_count} entries")
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(f"DELETE FROM {self.collection_name}")
             conn.commit()
@@ -30,6 +30,10 @@ class ChatMessage(BaseModel):
 # Define a router to register endpoints without requiring a global app at import time
 router: Final[fastapi.APIRouter] = fastapi.APIRouter()
 
+# Built once and shared by every streaming response; NDJSON lets clients parse
+# each message as soon as its line arrives.
+NDJSON_HEADERS: Final[dict[str, str]] = {"content-type": "application/x-ndjson"}
+
 
 def get_agent(request: fastapi.Request) -> AgentASK:
     return request.app.state.agent
@@ -61,7 +65,7 @@ async def post_chat(
         )
         yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
 
-    return StreamingResponse(stream_messages(), media_type="text/plain")
+    return StreamingResponse(stream_messages(), headers=NDJSON_HEADERS)
 
 
 def make_lifespan(agent: AgentASK):
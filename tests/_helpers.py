@@ -0,0 +1,61 @@
+from collections.abc import AsyncIterator, Iterable
+from datetime import UTC, datetime
+from typing import Any
+
+import orjson
+from pydantic import TypeAdapter
+
+from ask.core.rest_api import ChatMessage
+
+_CHAT_TA = TypeAdapter(ChatMessage)
+
+
+def _iso_now(_now=datetime.now, _tz=UTC) -> str:
+    """Current UTC time in ISO format; lookups are bound at definition time."""
+    return _now(_tz).isoformat()
+
+
+def ndjson_dump(msgs: Iterable[ChatMessage]) -> bytes:
+    """Serialize chat messages as NDJSON lines joined by newlines."""
+    return b"\n".join(_CHAT_TA.dump_json(msg) for msg in msgs)
+
+
+class FakeAgent:
+    """Agent stand-in returning canned outputs and recording its prompts.
+
+    Much cheaper per call than an AsyncMock, so cache step tests exercise
+    the cache rather than unittest.mock bookkeeping.
+    """
+
+    def __init__(self, outputs: Iterable[Any]):
+        self._outputs = iter(outputs)
+        self.calls: list[Any] = []
+
+    async def run(self, prompt: Any) -> Any:
+        self.calls.append(prompt)
+        return next(self._outputs)
+
+
+def _line(role: str, content: str) -> bytes:
+    """Encode one chat message as a newline-terminated NDJSON line."""
+    return orjson.dumps(
+        {
+            "role": role,
+            "timestamp": _iso_now(),
+            "content": content,
+        },
+        option=orjson.OPT_APPEND_NEWLINE,
+    )
+
+
+async def ndjson_stream(agent: Any, prompt: str) -> AsyncIterator[bytes]:
+    """Stream the user message and the agent reply (or error) as NDJSON."""
+    yield _line("user", prompt)
+
+    try:
+        result = await agent.run(prompt)
+        yield _line("assistant", result.output)
+        agent._history = agent._repack(result.all_messages())
+    except Exception as e:
+        # Use assistant role for error messages
+        yield _line("assistant", f"Error: {str(e)}")
@@ -0,0 +1,129 @@
+import importlib
+import itertools
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Protocol
+from unittest.mock import create_autospec
+
+import httpx
+import pytest
+import pytest_asyncio
+import yaml
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import StreamingResponse
+
+from ask.core.rest_api import NDJSON_HEADERS
+from tests._helpers import ndjson_stream
+
+
+class _AgentLike(Protocol):
+    """Subset of AgentASK the API tests touch.
+
+    Members carry class-level defaults so create_autospec can see them.
+    """
+
+    _history: list = []
+    _use_mcp_servers: bool = False
+    _agent: Any = nullcontext()
+
+    def _repack(self, messages: list) -> list: ...
+
+    async def run(self, prompt: str, **kwargs: Any) -> Any: ...
+
+
+# Imported once up front so no single test carries their import cost
+_WARM_IMPORTS = (
+    "pydantic_ai.models.openai",
+    "pydantic_ai.models.gemini",
+    "pydantic_ai.mcp",
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_imports():
+    """Import heavy pydantic_ai modules before the first test runs."""
+    for name in _WARM_IMPORTS:
+        importlib.import_module(name)
+
+
+@asynccontextmanager
+async def _noop_lifespan(app: FastAPI):
+    """Skip agent startup; tests install app.state.agent themselves."""
+    yield
+
+
+@pytest.fixture(scope="session")
+def app_factory():
+    """Factory building an app with a generic streaming POST /ask/ endpoint."""
+
+    def make_app() -> FastAPI:
+        app = FastAPI(lifespan=_noop_lifespan)
+
+        @app.post("/ask/")
+        async def mock_post_chat(request: Request, prompt: str = Form(...)):
+            return StreamingResponse(
+                ndjson_stream(request.app.state.agent, prompt),
+                headers=NDJSON_HEADERS,
+            )
+
+        return app
+
+    return make_app
+
+
+@pytest.fixture(scope="session")
+def app(app_factory) -> FastAPI:
+    """App shared by the whole session."""
+    return app_factory()
+
+
+@pytest_asyncio.fixture
+async def aclient(app: FastAPI):
+    """Async client calling the shared app in-process over ASGI."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        yield client
+
+
+@pytest.fixture
+def mock_agent(app: FastAPI):
+    """Fresh autospec'd mock agent installed on the shared app for each test."""
+    agent = create_autospec(_AgentLike, instance=True, spec_set=True)
+    agent._history = []
+    agent._repack.return_value = []
+    app.state.agent = agent
+    return agent
+
+
+# Minimal valid config that the config tests override section by section
+_BASE_CONFIG = {
+    "agent": {"instructions": "Test instructions."},
+    "llm": {"model": "openai:gpt-4o", "api_key": "env:TEST_API_KEY"},
+}
+
+
+@pytest.fixture(scope="session")
+def yaml_factory(tmp_path_factory):
+    """Factory writing the base config with per-section overrides to a file.
+
+    A section override of None drops that section; a dict is merged into it.
+    Identical configs are written once and share the same path.
+    """
+    base = tmp_path_factory.mktemp("cfg")
+    names = itertools.count()
+    written: dict[str, str] = {}
+
+    def make(overrides: dict | None = None) -> str:
+        data = {section: dict(values) for section, values in _BASE_CONFIG.items()}
+        for section, values in (overrides or {}).items():
+            if values is None:
+                data.pop(section, None)
+            else:
+                data[section] = {**data.get(section, {}), **values}
+        text = yaml.safe_dump(data, sort_keys=False)
+        if text not in written:
+            path = base / f"config{next(names)}.yaml"
+            path.write_text(text)
+            written[text] = str(path)
+        return written[text]
+
+    return make
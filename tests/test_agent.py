@@ -1,7 +1,12 @@
+from typing import Any
+
 import pytest
 from pydantic import BaseModel
+from pydantic_ai.usage import RunUsage
 
 from ask.core.agent import AgentASK
+from ask.core.cache import CacheASK, CacheStoreMemory
+from ask.core.memory import NoMemory
 
 
 class InputModel(BaseModel):
@@ -14,6 +19,66 @@ class OutputModel(BaseModel):
     count: int
 
 
+class _StubResult:
+    def __init__(self, output: str):
+        self.output = output
+
+    def all_messages(self) -> list:
+        return []
+
+    def usage(self) -> RunUsage:
+        return RunUsage(requests=1)
+
+
+class _StubAgent:
+    """pydantic_ai Agent stand-in answering every prompt with the same text."""
+
+    name = "stub_agent"
+    output_type = str
+
+    def __init__(self, output: str):
+        self._output = output
+        self.calls: list[str] = []
+
+    async def run(self, prompt: str, **kwargs: Any) -> _StubResult:
+        self.calls.append(prompt)
+        return _StubResult(self._output)
+
+
+def _cached_agent(stub: _StubAgent, cache: CacheASK) -> AgentASK[str, OutputModel]:
+    return AgentASK(
+        agent=stub,  # type: ignore
+        use_mcp_servers=False,
+        memory=NoMemory(),
+        input_type=str,
+        output_type=OutputModel,
+    ).cache(cache)
+
+
+class TestAgentCache:
+    @pytest.mark.asyncio
+    async def test_cache_hit_returns_output_model(self):
+        stub = _StubAgent('{"message": "hi", "count": 1}')
+        agent = _cached_agent(stub, CacheASK(CacheStoreMemory()))
+
+        first = await agent.run("prompt")
+        second = await agent.run("prompt")
+        assert isinstance(second, OutputModel)
+        assert second == first == OutputModel(message="hi", count=1)
+        assert stub.calls == ["prompt"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_cache_entry_runs_agent_again(self):
+        stub = _StubAgent('{"message": "hi", "count": 1}')
+        cache = CacheASK(CacheStoreMemory())
+        agent = _cached_agent(stub, cache)
+        cache.store.set(cache._step_key("stub_agent", "prompt"), {"message": "hi"})
+
+        result = await agent.run("prompt")
+        assert result == OutputModel(message="hi", count=1)
+        assert stub.calls == ["prompt"]
+
+
 class TestCreateAgentFromFunction:
     @pytest.mark.asyncio
     async def test_create_agent_from_function_str_to_str(self):
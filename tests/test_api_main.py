@@ -1,11 +1,12 @@
-import json
-from datetime import UTC, datetime
+import asyncio
+import io
 from unittest.mock import AsyncMock, MagicMock
 
+import httpx
 import pytest
-from fastapi import FastAPI, Form
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from orjson import loads as _loads
 
 # Import the functions we need to test directly
 from pydantic_ai.messages import (
@@ -15,22 +16,15 @@ from pydantic_ai.messages import (
     UserPromptPart,
 )
 
-from ask.core.rest_api import ChatMessage, make_lifespan
+from ask.core.rest_api import ChatMessage, make_lifespan, router
+from tests._helpers import ndjson_dump
 
-
-# Mock AgentASK class for testing
-class MockAgentASK:
-    """Mock AgentASK class for testing purposes."""
-
-    def __init__(self):
-        self._history = []
-        self._repack = MagicMock(return_value=[])
-        self._agent = MagicMock()
-
-    @classmethod
-    def create_from_config(cls, config):
-        """Mock factory method."""
-        return cls()
+_CHAT_MESSAGES = (
+    ChatMessage(role="user", timestamp="2024-01-01T12:00:00Z", content="Hello"),
+    ChatMessage(
+        role="assistant", timestamp="2024-01-01T12:00:01Z", content="Hi there!"
+    ),
+)
 
 
 # Mock API functions for testing when imports fail
@@ -44,320 +38,286 @@ async def mock_post_chat():
     return {"message": "mock response"}
 
 
+async def post_stream(
+    client: httpx.AsyncClient, prompt: str
+) -> tuple[httpx.Response, list[dict]]:
+    """POST a prompt and decode the NDJSON reply line by line as it streams."""
+    async with client.stream("POST", "/ask/", data={"prompt": prompt}) as response:
+        msgs = [_loads(line) async for line in response.aiter_lines() if line]
+    return response, msgs
+
+
+def make_result(prompt: str, output: str) -> MagicMock:
+    """Build a mock agent run result for a single prompt/response exchange."""
+    result = MagicMock()
+    result.output = output
+    result.all_messages.return_value = [
+        ModelRequest(parts=[UserPromptPart(content=prompt)]),
+        ModelResponse(parts=[TextPart(content=output)]),
+    ]
+    return result
+
+
+_MULTILINE_PROMPT = """Please help me write a Python function that:
+1. Takes a list of numbers
+2. Returns the sum of even numbers only
+3. Handles empty lists gracefully"""
+
+# Create a very long prompt (approximately 7,000 characters)
+_LONG_PROMPT = "Hello! " * 1000
+
+_VARIED_HISTORY = (
+    ModelRequest(parts=[UserPromptPart(content="Hello, how are you?")]),
+    ModelResponse(parts=[TextPart(content="I'm doing well, thank you for asking!")]),
+    ModelRequest(parts=[UserPromptPart(content="Can you help me with Python?")]),
+    ModelResponse(
+        parts=[
+            TextPart(
+                content="Of course! I'd be happy to help you with Python. What would you like to know?"
+            )
+        ]
+    ),
+    ModelRequest(parts=[UserPromptPart(content="Show me a simple function")]),
+    ModelResponse(
+        parts=[
+            TextPart(
+                content='Here\'s a simple Python function:\n\n```python\ndef greet(name):\n    return f"Hello, {name}!"\n\nprint(greet("World"))\n```'
+            )
+        ]
+    ),
+)
+
+# History returned after the first and second turns of a conversation
+_FIRST_EXCHANGE = (
+    ModelRequest(parts=[UserPromptPart(content="Hi there!")]),
+    ModelResponse(parts=[TextPart(content="Hello! Nice to meet you!")]),
+)
+
+_SECOND_EXCHANGE = (
+    *_FIRST_EXCHANGE,
+    ModelRequest(parts=[UserPromptPart(content="How are you?")]),
+    ModelResponse(parts=[TextPart(content="I'm doing well, thank you for asking!")]),
+)
+
+
 class TestNDJSONFormatting:
     """Test NDJSON formatting for chat messages."""
 
     def test_format_chat_messages_as_ndjson(self):
         """Test formatting chat messages as NDJSON."""
-        chat_messages = [
-            ChatMessage(role="user", timestamp="2024-01-01T12:00:00Z", content="Hello"),
-            ChatMessage(
-                role="assistant", timestamp="2024-01-01T12:00:01Z", content="Hi there!"
-            ),
-        ]
+        chat_messages = _CHAT_MESSAGES
 
         # Simulate the NDJSON formatting from the API
-        payload = b"\n".join(
+        payload = ndjson_dump(chat_messages)
+
+        # The cached adapter must serialize exactly like the model itself
+        assert payload == b"\n".join(
             msg.model_dump_json().encode("utf-8") for msg in chat_messages
         )
 
         # Parse back to verify
-        lines = payload.decode().strip().split("\n")
+        lines = payload.splitlines()
         assert len(lines) == 2
 
-        msg1 = json.loads(lines[0])
-        msg2 = json.loads(lines[1])
+        msg1 = _loads(lines[0])
+        msg2 = _loads(lines[1])
 
         assert msg1["role"] == "user"
         assert msg1["content"] == "Hello"
         assert msg2["role"] == "assistant"
         assert msg2["content"] == "Hi there!"
 
+    def test_ndjson_is_streamable(self):
+        """Test each NDJSON line is written and parseable on its own."""
+        buffer = io.BytesIO()
+        for msg in _CHAT_MESSAGES:
+            start = buffer.tell()
+            buffer.writelines((ndjson_dump((msg,)), b"\n"))
+
+            # Every line must stand alone so clients can parse it as it arrives
+            line = buffer.getvalue()[start:]
+            assert line.endswith(b"\n")
+            assert _loads(line) == msg.model_dump()
+
+        # Streaming line by line yields the joined payload plus a final newline
+        assert buffer.getvalue() == ndjson_dump(_CHAT_MESSAGES) + b"\n"
+
     def test_empty_chat_messages_ndjson(self):
         """Test NDJSON formatting with empty message list."""
         chat_messages = []
-        payload = b"\n".join(
-            msg.model_dump_json().encode("utf-8") for msg in chat_messages
-        )
+        payload = ndjson_dump(chat_messages)
 
         assert payload == b""
 
 
-class TestPositiveScenarios:
-    """Positive test scenarios for the chat API."""
+class TestLifespan:
+    """The real lifespan is exercised once; the shared app uses a no-op one."""
 
-    @pytest.fixture
-    def mock_agent_with_varied_history(self):
-        """Create a mock agent with varied message history."""
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_history = [
-            ModelRequest(parts=[UserPromptPart(content="Hello, how are you?")]),
-            ModelResponse(
-                parts=[TextPart(content="I'm doing well, thank you for asking!")]
-            ),
-            ModelRequest(
-                parts=[UserPromptPart(content="Can you help me with Python?")]
-            ),
-            ModelResponse(
-                parts=[
-                    TextPart(
-                        content="Of course! I'd be happy to help you with Python. What would you like to know?"
-                    )
-                ]
-            ),
-            ModelRequest(parts=[UserPromptPart(content="Show me a simple function")]),
-            ModelResponse(
-                parts=[
-                    TextPart(
-                        content='Here\'s a simple Python function:\n\n```python\ndef greet(name):\n    return f"Hello, {name}!"\n\nprint(greet("World"))\n```'
-                    )
-                ]
-            ),
-        ]
-        mock_agent._history = mock_history
-        mock_agent._repack = MagicMock(return_value=mock_history)
-        mock_agent._agent = MagicMock()  # Add the _agent attribute
-        return mock_agent
+    @pytest.mark.parametrize("use_mcp_servers", [False, True])
+    def test_lifespan_calls_make_lifespan(self, mock_agent, use_mcp_servers):
+        """Test make_lifespan installs the agent and enters MCP servers if used."""
+        mock_agent._use_mcp_servers = use_mcp_servers
+        app = FastAPI(lifespan=make_lifespan(mock_agent))
 
-    def test_post_chat_with_multiline_prompt(self):
-        """Test POST /ask/ with multiline prompt."""
+        with TestClient(app):
+            assert app.state.agent is mock_agent
 
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock(return_value=[])
-        mock_agent._agent = MagicMock()
+        if use_mcp_servers:
+            mock_agent._agent.__aenter__.assert_awaited_once()
+        else:
+            mock_agent._agent.__aenter__.assert_not_called()
 
-        multiline_prompt = """Please help me write a Python function that:
-1. Takes a list of numbers
-2. Returns the sum of even numbers only
-3. Handles empty lists gracefully"""
 
-        mock_result = MagicMock()
-        mock_result.output = (
-            "Here's the function you requested:\n\n"
-            "```python\n"
-            "def sum_even_numbers(numbers):\n"
-            "    if not numbers:\n        return 0\n"
-            "    return sum(num for num in numbers if num % 2 == 0)\n"
-            "```"
-        )
-        mock_result.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content=multiline_prompt)]),
-            ModelResponse(parts=[TextPart(content=mock_result.output)]),
-        ]
-        mock_agent.run = AsyncMock(return_value=mock_result)
-
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                result = await mock_agent.run(prompt)
-
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                mock_agent._history = mock_agent._repack(result.all_messages())
+class TestChatRouter:
+    """The production POST /chat/ route; the shared app mounts a mock one."""
 
-            return StreamingResponse(stream_messages(), media_type="text/plain")
+    @pytest.mark.asyncio
+    async def test_post_chat_streams_ndjson(self):
+        """Test POST /chat/ streams the user and assistant messages as NDJSON."""
+        agent = MagicMock()
+        agent._iter.return_value = AsyncMock(return_value="Hi there!")
+        app = FastAPI()
+        app.include_router(router)
+        app.state.agent = agent
 
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-        response = client.post("/ask/", data={"prompt": multiline_prompt})
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://t"
+        ) as client:
+            async with client.stream(
+                "POST", "/chat/", data={"prompt": "Hello"}
+            ) as response:
+                lines = [line async for line in response.aiter_lines() if line]
 
         assert response.status_code == 200
-        assert "text/plain" in response.headers["content-type"]
-
-        lines = response.content.decode().strip().split("\n")
-        assert len(lines) == 2
-
-        user_msg = json.loads(lines[0])
-        assistant_msg = json.loads(lines[1])
-
-        assert user_msg["role"] == "user"
-        assert user_msg["content"] == multiline_prompt
-        assert assistant_msg["role"] == "assistant"
-        assert "function" in assistant_msg["content"].lower()
-
-    def test_post_chat_with_special_characters(self):
-        """Test POST /ask/ with special characters and unicode."""
-
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock(return_value=[])
-        mock_agent._agent = MagicMock()
-
-        special_prompt = "Hello 🌟! How do I use émojis and spëcial chärs in Python? 🤖"
-
-        mock_result = MagicMock()
-        mock_result.output = (
-            "You can use emojis and special characters in Python strings directly! 🎉"
+        assert response.headers["content-type"] == "application/x-ndjson"
+        user_msg, assistant_msg = (_loads(line) for line in lines)
+        assert (user_msg["role"], user_msg["content"]) == ("user", "Hello")
+        assert (assistant_msg["role"], assistant_msg["content"]) == (
+            "assistant",
+            "Hi there!",
         )
-        mock_result.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content=special_prompt)]),
-            ModelResponse(parts=[TextPart(content=mock_result.output)]),
-        ]
-        mock_agent.run = AsyncMock(return_value=mock_result)
-
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                result = await mock_agent.run(prompt)
+        agent._iter.assert_called_once_with("Hello")
 
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
 
-                mock_agent._history = mock_agent._repack(result.all_messages())
+class TestPositiveScenarios:
+    """Positive test scenarios for the chat API."""
 
-            return StreamingResponse(stream_messages(), media_type="text/plain")
+    @pytest.fixture
+    def mock_agent_with_varied_history(self, mock_agent):
+        """Create a mock agent with varied message history."""
+        mock_agent._history = list(_VARIED_HISTORY)
+        mock_agent._repack = MagicMock(return_value=_VARIED_HISTORY)
+        return mock_agent
 
-        test_app.post("/ask/")(mock_post_chat)
+    @pytest.mark.parametrize(
+        "prompt,expected_output",
+        [
+            pytest.param(
+                _MULTILINE_PROMPT,
+                "Here's the function you requested:\n\n"
+                "```python\n"
+                "def sum_even_numbers(numbers):\n"
+                "    if not numbers:\n        return 0\n"
+                "    return sum(num for num in numbers if num % 2 == 0)\n"
+                "```",
+                id="multiline",
+            ),
+            pytest.param(
+                "Hello 🌟! How do I use émojis and spëcial chärs in Python? 🤖",
+                "You can use emojis and special characters in Python strings directly! 🎉",
+                id="special-characters",
+            ),
+            pytest.param(
+                "",
+                "I received an empty message. How can I help you?",
+                id="empty",
+            ),
+            pytest.param(
+                "   \n\t  \n  ",
+                "I see you've sent a message with only whitespace. Is there something specific you'd like to talk about?",
+                id="whitespace-only",
+            ),
+            pytest.param(
+                _LONG_PROMPT,
+                "That's a very long message! Let me help you with that.",
+                id="extremely-long",
+            ),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_post_chat_roundtrip(
+        self, aclient, mock_agent, prompt, expected_output
+    ):
+        """Test POST /ask/ echoes the prompt and streams the agent output."""
+        mock_agent.run = AsyncMock(return_value=make_result(prompt, expected_output))
 
-        client = TestClient(test_app)
-        response = client.post("/ask/", data={"prompt": special_prompt})
+        response, msgs = await post_stream(aclient, prompt)
 
         assert response.status_code == 200
-        lines = response.content.decode().strip().split("\n")
-        assert len(lines) == 2
+        assert "application/x-ndjson" in response.headers["content-type"]
+        assert len(msgs) == 2
 
-        user_msg = json.loads(lines[0])
-        assistant_msg = json.loads(lines[1])
+        user_msg, assistant_msg = msgs
 
-        assert user_msg["content"] == special_prompt
-        assert assistant_msg["content"] == mock_result.output
+        assert user_msg["role"] == "user"
+        assert user_msg["content"] == prompt  # Prompt is preserved verbatim
+        assert assistant_msg["role"] == "assistant"
+        assert assistant_msg["content"] == expected_output
 
-    def test_conversation_persistence_across_requests(self):
+    @pytest.mark.asyncio
+    async def test_conversation_persistence_across_requests(self, aclient, mock_agent):
         """Test that conversation history persists across multiple requests."""
+        # Repack accumulates into test-local state instead of the shared mock
+        history: list = []
 
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock()
-        mock_agent._agent = MagicMock()  # Add the _agent attribute
-
-        # Set up repack to return accumulated history
-        def accumulate_history(messages):
-            mock_agent._history = messages
-            return messages
+        def accumulate(messages):
+            history[:] = messages
+            return list(history)
 
-        mock_agent._repack.side_effect = accumulate_history
-
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
+        mock_agent._repack.side_effect = accumulate
 
         # First interaction
         mock_result1 = MagicMock()
         mock_result1.output = "Hello! Nice to meet you!"
-        mock_result1.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content="Hi there!")]),
-            ModelResponse(parts=[TextPart(content="Hello! Nice to meet you!")]),
-        ]
+        mock_result1.all_messages.return_value = _FIRST_EXCHANGE
 
         # Second interaction
         mock_result2 = MagicMock()
         mock_result2.output = "I'm doing well, thank you for asking!"
-        mock_result2.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content="Hi there!")]),
-            ModelResponse(parts=[TextPart(content="Hello! Nice to meet you!")]),
-            ModelRequest(parts=[UserPromptPart(content="How are you?")]),
-            ModelResponse(
-                parts=[TextPart(content="I'm doing well, thank you for asking!")]
-            ),
-        ]
+        mock_result2.all_messages.return_value = _SECOND_EXCHANGE
 
-        # Mock agent run calls
-        call_count = 0
+        # Each run returns the next interaction's result
+        results = iter((mock_result1, mock_result2))
 
         async def mock_run(prompt, **kwargs):
-            nonlocal call_count
-            call_count += 1
-            if call_count == 1:
-                return mock_result1
-            else:
-                return mock_result2
-
-        mock_agent.run = AsyncMock(side_effect=mock_run)
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
+            return next(results)
 
-                result = await mock_agent.run(prompt)
-
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                mock_agent._history = mock_agent._repack(result.all_messages())
-
-            return StreamingResponse(stream_messages(), media_type="text/plain")
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
+        mock_agent.run = mock_run
 
         # First request
-        response1 = client.post("/ask/", data={"prompt": "Hi there!"})
+        response1, _ = await post_stream(aclient, "Hi there!")
         assert response1.status_code == 200
 
         # Second request - should have context from first
-        response2 = client.post("/ask/", data={"prompt": "How are you?"})
+        response2, _ = await post_stream(aclient, "How are you?")
         assert response2.status_code == 200
 
-        # Verify agent was called with accumulated history on second call
-        assert mock_agent.run.call_count == 2
+        # Verify agent was called twice and history holds both exchanges
+        assert next(results, None) is None
+        assert history == list(_SECOND_EXCHANGE)
+        assert mock_agent._history == history
 
 
 class TestNegativeScenarios:
     """Negative test scenarios for the chat API."""
 
-    def test_post_chat_missing_prompt_field(self):
+    @pytest.mark.asyncio
+    async def test_post_chat_missing_prompt_field(self, aclient):
         """Test POST /ask/ with missing prompt field."""
 
-        mock_agent = MagicMock(spec=MockAgentASK)
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            return {"error": "Should not reach here"}
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-
         # Send request without prompt field
-        response = client.post("/ask/", data={})  # Empty form data
+        response = await aclient.post("/ask/", data={})  # Empty form data
 
         # FastAPI should return 422 for missing required field
         assert response.status_code == 422
@@ -365,317 +325,54 @@ class TestNegativeScenarios:
         assert "detail" in error_data
         assert any("prompt" in str(error).lower() for error in error_data["detail"])
 
-    def test_post_chat_empty_prompt(self):
-        """Test POST /ask/ with empty prompt string."""
-
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock(return_value=[])
-        mock_agent._agent = MagicMock()  # Add the _agent attribute
-
-        mock_result = MagicMock()
-        mock_result.output = "I received an empty message. How can I help you?"
-        mock_result.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content="")]),  # Empty prompt
-            ModelResponse(parts=[TextPart(content=mock_result.output)]),
-        ]
-
-        mock_agent.run = AsyncMock(return_value=mock_result)
-
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                result = await mock_agent.run(prompt)
-
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                mock_agent._history = mock_agent._repack(result.all_messages())
-
-            return StreamingResponse(stream_messages(), media_type="text/plain")
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-        response = client.post("/ask/", data={"prompt": ""})
-
-        assert response.status_code == 200
-        lines = response.content.decode().strip().split("\n")
-        assert len(lines) == 2
-
-        user_msg = json.loads(lines[0])
-        assistant_msg = json.loads(lines[1])
-
-        assert user_msg["content"] == ""  # Empty prompt should be preserved
-        assert assistant_msg["content"] == mock_result.output
-
-    def test_post_chat_whitespace_only_prompt(self):
-        """Test POST /ask/ with whitespace-only prompt."""
-
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock(return_value=[])
-        mock_agent._agent = MagicMock()  # Add the _agent attribute
-
-        whitespace_prompt = "   \n\t  \n  "
-
-        mock_result = MagicMock()
-        mock_result.output = "I see you've sent a message with only whitespace. Is there something specific you'd like to talk about?"
-        mock_result.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content=whitespace_prompt)]),
-            ModelResponse(parts=[TextPart(content=mock_result.output)]),
-        ]
-
-        mock_agent.run = AsyncMock(return_value=mock_result)
-
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                result = await mock_agent.run(prompt)
-
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                mock_agent._history = mock_agent._repack(result.all_messages())
-
-            return StreamingResponse(stream_messages(), media_type="text/plain")
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-        response = client.post("/ask/", data={"prompt": whitespace_prompt})
-
-        assert response.status_code == 200
-        lines = response.content.decode().strip().split("\n")
-        assert len(lines) == 2
-
-        user_msg = json.loads(lines[0])
-        assistant_msg = json.loads(lines[1])
-
-        assert user_msg["content"] == whitespace_prompt
-        assert assistant_msg["content"] == mock_result.output
-
-    def test_post_chat_agent_runtime_error(self):
+    @pytest.mark.asyncio
+    async def test_post_chat_agent_runtime_error(self, aclient, mock_agent):
         """Test POST /ask/ when agent raises a runtime error."""
 
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock(return_value=[])
-        mock_agent._agent = MagicMock()  # Add the _agent attribute
-
         # Mock agent to raise an exception
         mock_agent.run = AsyncMock(
             side_effect=RuntimeError("Model service unavailable")
         )
 
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                try:
-                    result = await mock_agent.run(prompt)
-
-                    assistant_msg = ChatMessage(
-                        role="assistant",
-                        timestamp=datetime.now(tz=UTC).isoformat(),
-                        content=result.output,
-                    )
-                    yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                    mock_agent._history = mock_agent._repack(result.all_messages())
-                except Exception as e:
-                    error_msg = ChatMessage(
-                        role="assistant",  # Use assistant role for error messages
-                        timestamp=datetime.now(tz=UTC).isoformat(),
-                        content=f"Error: {str(e)}",
-                    )
-                    yield error_msg.model_dump_json().encode("utf-8") + b"\n"
-
-            return StreamingResponse(stream_messages(), media_type="text/plain")
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-        response = client.post("/ask/", data={"prompt": "Test prompt"})
+        response, msgs = await post_stream(aclient, "Test prompt")
 
         assert response.status_code == 200  # Streaming response still returns 200
-        lines = response.content.decode().strip().split("\n")
-        assert len(lines) == 2  # User message + error message
+        assert len(msgs) == 2  # User message + error message
 
-        user_msg = json.loads(lines[0])
-        error_msg = json.loads(lines[1])
+        user_msg, error_msg = msgs
 
         assert user_msg["role"] == "user"
         assert user_msg["content"] == "Test prompt"
         assert error_msg["role"] == "assistant"
         assert "Model service unavailable" in error_msg["content"]
 
-    def test_post_chat_extremely_long_prompt(self):
-        """Test POST /ask/ with extremely long prompt."""
-
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock(return_value=[])
-        mock_agent._agent = MagicMock()  # Add the _agent attribute
-
-        # Create a very long prompt (10,000 characters)
-        long_prompt = "Hello! " * 1000  # Approximately 7,000 characters
-
-        mock_result = MagicMock()
-        mock_result.output = "That's a very long message! Let me help you with that."
-        mock_result.all_messages.return_value = [
-            ModelRequest(parts=[UserPromptPart(content=long_prompt)]),
-            ModelResponse(parts=[TextPart(content=mock_result.output)]),
-        ]
-
-        mock_agent.run = AsyncMock(return_value=mock_result)
-
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                result = await mock_agent.run(prompt)
-
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                mock_agent._history = mock_agent._repack(result.all_messages())
-
-            return StreamingResponse(stream_messages(), media_type="text/plain")
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-        response = client.post("/ask/", data={"prompt": long_prompt})
-
-        assert response.status_code == 200
-        lines = response.content.decode().strip().split("\n")
-        assert len(lines) == 2
-
-        user_msg = json.loads(lines[0])
-        assistant_msg = json.loads(lines[1])
-
-        assert len(user_msg["content"]) == len(long_prompt)
-        assert user_msg["content"] == long_prompt
-        assert assistant_msg["content"] == mock_result.output
-
-    def test_concurrent_requests_simulation(self):
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_simulation(self, aclient, mock_agent):
         """Test behavior with simulated concurrent requests."""
-        import asyncio
-
-        mock_agent = MagicMock(spec=MockAgentASK)
-        mock_agent._history = []
-        mock_agent._repack = MagicMock()
-        mock_agent._agent = MagicMock()
-
-        call_order: list[str] = []
-        history_states: list[int] = []
 
         async def mock_run(prompt, **kwargs):
-            call_order.append(prompt)
-            history_states.append(len(kwargs.get("message_history", [])))
             await asyncio.sleep(0.01)
-
-            mock_result = MagicMock()
-            mock_result.output = f"Response to: {prompt}"
-            mock_result.all_messages.return_value = [
-                ModelRequest(parts=[UserPromptPart(content=prompt)]),
-                ModelResponse(parts=[TextPart(content=f"Response to: {prompt}")]),
-            ]
-            return mock_result
+            return make_result(prompt, f"Response to: {prompt}")
 
         mock_agent.run = AsyncMock(side_effect=mock_run)
         mock_agent._repack.return_value = []
 
-        test_app = FastAPI(lifespan=make_lifespan(mock_agent))
-        test_app.state.agent = mock_agent
-
-        async def mock_post_chat(prompt: str = Form(...)):
-            async def stream_messages():
-                user_msg = ChatMessage(
-                    role="user",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=prompt,
-                )
-                yield user_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                result = await mock_agent.run(prompt)
-
-                assistant_msg = ChatMessage(
-                    role="assistant",
-                    timestamp=datetime.now(tz=UTC).isoformat(),
-                    content=result.output,
-                )
-                yield assistant_msg.model_dump_json().encode("utf-8") + b"\n"
-
-                mock_agent._history = mock_agent._repack(result.all_messages())
-
-            return StreamingResponse(stream_messages(), media_type="text/plain")
-
-        test_app.post("/ask/")(mock_post_chat)
-
-        client = TestClient(test_app)
-
-        responses = []
-        for i in range(3):
-            response = client.post("/ask/", data={"prompt": f"Request {i + 1}"})
-            responses.append(response)
+        prompts = [f"Request {i + 1}" for i in range(3)]
+        streams = await asyncio.gather(
+            *(post_stream(aclient, prompt) for prompt in prompts)
+        )
 
-        for i, response in enumerate(responses):
+        # Requests overlap, so match each reply to its prompt by content
+        replies = {}
+        for response, msgs in streams:
             assert response.status_code == 200
-            lines = response.content.decode().strip().split("\n")
-            assert len(lines) == 2
+            assert len(msgs) == 2
 
-            user_msg = json.loads(lines[0])
-            assistant_msg = json.loads(lines[1])
+            user_msg, assistant_msg = msgs
+            replies[user_msg["content"]] = assistant_msg["content"]
 
-            assert user_msg["content"] == f"Request {i + 1}"
-            assert assistant_msg["content"] == f"Response to: Request {i + 1}"
+        assert sorted(replies) == prompts
+        for prompt in prompts:
+            assert replies[prompt] == f"Response to: {prompt}"
 
         assert mock_agent.run.call_count == 3
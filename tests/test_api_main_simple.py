@@ -1,5 +1,7 @@
 import json
 
+from orjson import loads as _loads
+
 
 class TestNDJSONFormatting:
     """Test NDJSON formatting for chat messages."""
@@ -19,11 +21,11 @@ class TestNDJSONFormatting:
         payload = b"\n".join(json.dumps(msg).encode("utf-8") for msg in chat_messages)
 
         # Parse back to verify
-        lines = payload.decode().strip().split("\n")
+        lines = payload.splitlines()
         assert len(lines) == 2
 
-        msg1 = json.loads(lines[0])
-        msg2 = json.loads(lines[1])
+        msg1 = _loads(lines[0])
+        msg2 = _loads(lines[1])
 
         assert msg1["role"] == "user"
         assert msg1["content"] == "Hello"
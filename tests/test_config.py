@@ -1,41 +1,35 @@
 import pytest
+from pydantic import ValidationError
 
-from ask.core.config import Config, load_config
+from ask.core.config import Config, _clear_config_cache, load_config
 
 
-def test_load_config_success(tmp_path, monkeypatch):
-    # Prepare a config file with env var for api_key
-    config_yaml = """
-agent:
-  instructions: "Test instructions."
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:TEST_API_KEY"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+def _validation_errors(exc_info) -> list[dict]:
+    """Structured pydantic errors behind a config validation RuntimeError."""
+    cause = exc_info.value.__cause__
+    assert isinstance(cause, ValidationError)
+    return cause.errors(include_url=False)
+
+
+def test_load_config_success(yaml_factory, monkeypatch):
+    # Base config uses an env var for api_key
+    config_path = yaml_factory()
     monkeypatch.setenv("TEST_API_KEY", "dummy-key")
-    cfg = load_config([str(config_path)])
+    cfg = load_config([config_path])
     assert isinstance(cfg, Config)
     assert cfg.llm.api_key == "dummy-key"
     assert cfg.agent.instructions == "Test instructions."
     assert cfg.llm.model == "openai:gpt-4o"
 
 
-def test_load_config_missing_env(monkeypatch, tmp_path):
-    config_yaml = """
-agent:
-  instructions: "Test instructions."
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:NOT_SET_ENV"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+def test_load_config_missing_env(monkeypatch, yaml_factory):
+    config_path = yaml_factory({"llm": {"api_key": "env:NOT_SET_ENV"}})
     monkeypatch.delenv("NOT_SET_ENV", raising=False)
     with pytest.raises(RuntimeError) as exc:
-        load_config([str(config_path)])
-    assert "Environment variable 'NOT_SET_ENV' not set" in str(exc.value)
+        load_config([config_path])
+    (error,) = _validation_errors(exc)
+    assert error["loc"] == ("llm", "api_key")
+    assert "Environment variable 'NOT_SET_ENV' not set" in error["msg"]
 
 
 def test_load_config_file_not_found():
@@ -53,120 +47,170 @@ def test_load_config_yaml_error(tmp_path):
     assert "YAML syntax error" in str(exc.value)
 
 
-def test_load_config_invalid_types(tmp_path, monkeypatch):
-    config_yaml = """
-agent:
-  instructions: 12345  # Should be str
-llm:
-  model: 67890         # Should be str
-  api_key: "env:TEST_API_KEY"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+def test_load_config_invalid_types(yaml_factory, monkeypatch):
+    config_path = yaml_factory(
+        {
+            "agent": {"instructions": 12345},  # Should be str
+            "llm": {"model": 67890},  # Should be str
+        }
+    )
     monkeypatch.setenv("TEST_API_KEY", "dummy-key")
     with pytest.raises(RuntimeError) as exc:
-        load_config([str(config_path)])
-    assert "Config validation error" in str(exc.value)
+        load_config([config_path])
+    errors = {error["loc"]: error["type"] for error in _validation_errors(exc)}
+    assert errors == {
+        ("agent", "instructions"): "string_type",
+        ("llm", "model"): "string_type",
+    }
 
 
-def test_load_config_missing_required(tmp_path):
-    config_yaml = """
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:TEST_API_KEY"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+def test_load_config_missing_required(yaml_factory):
+    config_path = yaml_factory({"agent": None})
     with pytest.raises(RuntimeError) as exc:
-        load_config([str(config_path)])
-    assert "Config validation error" in str(exc.value)
-
-
-def test_load_config_extra_fields(tmp_path, monkeypatch):
-    config_yaml = """
-agent:
-  instructions: "Test instructions."
-  extra_field: "should not be here"
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:TEST_API_KEY"
-  another_extra: "nope"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+        load_config([config_path])
+    locs = {error["loc"]: error["type"] for error in _validation_errors(exc)}
+    assert locs[("agent",)] == "missing"
+
+
+def test_load_config_extra_fields(yaml_factory, monkeypatch):
+    config_path = yaml_factory(
+        {
+            "agent": {"extra_field": "should not be here"},
+            "llm": {"another_extra": "nope"},
+        }
+    )
     monkeypatch.setenv("TEST_API_KEY", "dummy-key")
     # With extra fields forbidden, loading should raise a validation error
     with pytest.raises(RuntimeError) as exc:
-        load_config([str(config_path)])
-    assert "Config validation error" in str(exc.value)
+        load_config([config_path])
+    errors = {error["loc"]: error["type"] for error in _validation_errors(exc)}
+    assert errors == {
+        ("agent", "extra_field"): "extra_forbidden",
+        ("llm", "another_extra"): "extra_forbidden",
+    }
 
 
-def test_mcp_env_field_success(tmp_path, monkeypatch):
+def test_mcp_env_field_success(yaml_factory, monkeypatch):
     """Test MCPServerConfig env field loads and validates correctly."""
-    config_yaml = """
-agent:
-  instructions: "Test instructions."
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:TEST_API_KEY"
-mcp:
-  fetch:
-    enabled: true
-    command: ["uvx", "mcp-server-fetch"]
-    env:
-      FOO: "bar"
-      BAZ: "qux"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+    config_path = yaml_factory(
+        {
+            "mcp": {
+                "fetch": {
+                    "enabled": True,
+                    "command": ["uvx", "mcp-server-fetch"],
+                    "env": {"FOO": "bar", "BAZ": "qux"},
+                }
+            }
+        }
+    )
     monkeypatch.setenv("TEST_API_KEY", "dummy-key")
-    cfg = load_config([str(config_path)])
+    cfg = load_config([config_path])
     assert isinstance(cfg, Config)
     assert cfg.mcp is not None
     assert cfg.mcp["fetch"].env == {"FOO": "bar", "BAZ": "qux"}
 
 
-def test_mcp_env_field_invalid_type(tmp_path, monkeypatch):
+def test_mcp_env_field_invalid_type(yaml_factory, monkeypatch):
     """Test MCPServerConfig env field with invalid type (not a dict)."""
-    config_yaml = """
-agent:
-  instructions: "Test instructions."
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:TEST_API_KEY"
-mcp:
-  fetch:
-    enabled: true
-    command: ["uvx", "mcp-server-fetch"]
-    env: "not-a-dict"
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+    config_path = yaml_factory(
+        {
+            "mcp": {
+                "fetch": {
+                    "enabled": True,
+                    "command": ["uvx", "mcp-server-fetch"],
+                    "env": "not-a-dict",
+                }
+            }
+        }
+    )
     monkeypatch.setenv("TEST_API_KEY", "dummy-key")
     with pytest.raises(RuntimeError) as exc:
-        load_config([str(config_path)])
-    assert "env must be a dictionary" in str(exc.value)
+        load_config([config_path])
+    (error,) = _validation_errors(exc)
+    assert error["loc"] == ("mcp", "fetch", "env")
+    assert "env must be a dictionary" in error["msg"]
 
 
-def test_mcp_env_field_non_str_key_value(tmp_path, monkeypatch):
+def test_mcp_env_field_non_str_key_value(yaml_factory, monkeypatch):
     """Test MCPServerConfig env field with non-string key or value."""
-    config_yaml = """
-agent:
-  instructions: "Test instructions."
-llm:
-  model: "openai:gpt-4o"
-  api_key: "env:TEST_API_KEY"
-mcp:
-  fetch:
-    enabled: true
-    command: ["uvx", "mcp-server-fetch"]
-    env:
-      123: "bar"
-      FOO: 456
-"""
-    config_path = tmp_path / "config.yaml"
-    config_path.write_text(config_yaml)
+    config_path = yaml_factory(
+        {
+            "mcp": {
+                "fetch": {
+                    "enabled": True,
+                    "command": ["uvx", "mcp-server-fetch"],
+                    "env": {123: "bar", "FOO": 456},
+                }
+            }
+        }
+    )
     monkeypatch.setenv("TEST_API_KEY", "dummy-key")
     with pytest.raises(RuntimeError) as exc:
-        load_config([str(config_path)])
-    assert "env keys and values must be strings" in str(exc.value)
+        load_config([config_path])
+    (error,) = _validation_errors(exc)
+    assert error["loc"] == ("mcp", "fetch", "env")
+    assert "env keys and values must be strings" in error["msg"]
+
+
+def test_load_config_reparses_modified_file(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(
+        'agent:\n  instructions: "First."\nllm:\n  model: "openai:gpt-4o"\n'
+    )
+    assert load_config([str(config_path)]).agent.instructions == "First."
+
+    # Different size and mtime invalidate the cached parse
+    config_path.write_text(
+        'agent:\n  instructions: "Second one."\nllm:\n  model: "openai:gpt-4o"\n'
+    )
+    assert load_config([str(config_path)]).agent.instructions == "Second one."
+
+
+def test_load_config_cached_parse_is_not_mutated(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text('agent:\n  instructions: "A."\nllm:\n  model: "m"\n')
+    override_path = tmp_path / "override.yaml"
+    override_path.write_text('llm:\n  model: "other"\n')
+
+    assert load_config([str(config_path), str(override_path)]).llm.model == "other"
+    assert load_config([str(config_path)]).llm.model == "m"
+    _clear_config_cache()
+    assert load_config([str(config_path)]).llm.model == "m"
+
+
+def test_load_config_missing_file_checked_before_parsing(tmp_path):
+    bad_path = tmp_path / "bad.yaml"
+    bad_path.write_text("agent: [bad: yaml")
+    with pytest.raises(RuntimeError) as exc:
+        load_config([str(bad_path), str(tmp_path / "missing.yaml")])
+    assert "missing.yaml' not found" in str(exc.value)
+
+
+def test_load_config_many_files_merge_in_order(tmp_path):
+    paths = []
+    for i in range(4):
+        config_path = tmp_path / f"config{i}.yaml"
+        config_path.write_text(
+            f'agent:\n  instructions: "File {i}."\nllm:\n  model: "model-{i}"\n'
+        )
+        paths.append(str(config_path))
+    # Drop llm from the last file so it comes from the one before it
+    (tmp_path / "config3.yaml").write_text('agent:\n  instructions: "File 3."\n')
+
+    cfg = load_config(paths)
+    assert cfg.agent.instructions == "File 3."
+    assert cfg.llm.model == "model-2"
+
+
+def test_load_config_many_files_yaml_error(tmp_path):
+    paths = []
+    for i in range(4):
+        config_path = tmp_path / f"config{i}.yaml"
+        config_path.write_text('llm:\n  model: "m"\n')
+        paths.append(str(config_path))
+    (tmp_path / "config2.yaml").write_text("agent: [bad: yaml")
+
+    with pytest.raises(RuntimeError) as exc:
+        load_config(paths)
+    assert "YAML syntax error in" in str(exc.value)
+    assert "config2.yaml" in str(exc.value)
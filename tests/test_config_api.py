@@ -1,70 +1,56 @@
-import os
-import tempfile
-
 import pytest
-import yaml
 
 from ask.core.config import Config, load_config
 
 
-def write_yaml_file(data: dict) -> str:
-    fd, path = tempfile.mkstemp(suffix=".yaml")
-    with os.fdopen(fd, "w") as f:
-        yaml.dump(data, f)
-    return path
-
-
-def test_load_config_single_file():
-    config_data = {
-        "agent": {"instructions": "Test agent", "output_type": "str"},
-        "llm": {"model": "openai/gpt-4", "api_key": "test-key"},
-        "mcp": None,
-    }
-    path = write_yaml_file(config_data)
+def test_load_config_single_file(yaml_factory):
+    path = yaml_factory(
+        {
+            "agent": {"instructions": "Test agent", "output_type": "str"},
+            "llm": {"model": "openai/gpt-4", "api_key": "test-key"},
+        }
+    )
     cfg = load_config([path])
     assert isinstance(cfg, Config)
     assert cfg.agent.instructions == "Test agent"
     assert cfg.llm.model == "openai/gpt-4"
-    os.remove(path)
 
 
-def test_load_config_multiple_files():
+def test_load_config_multiple_files(yaml_factory):
     base_data = {
         "agent": {"instructions": "Base agent", "output_type": "str"},
         "llm": {"model": "openai/gpt-3", "api_key": "base-key"},
     }
-    override_data = {"llm": {"model": "openai/gpt-4", "api_key": "override-key"}}
-    path1 = write_yaml_file(base_data)
-    path2 = write_yaml_file(override_data)
+    # drop the agent section so the override file only carries llm
+    override_data = {
+        "agent": None,
+        "llm": {"model": "openai/gpt-4", "api_key": "override-key"},
+    }
+    path1 = yaml_factory(base_data)
+    path2 = yaml_factory(override_data)
     cfg = load_config([path1, path2])
     assert cfg.llm.model == "openai/gpt-4"
     assert cfg.llm.api_key == "override-key"
     assert cfg.agent.instructions == "Base agent"
-    os.remove(path1)
-    os.remove(path2)
 
 
-def test_load_config_file_not_found():
+def test_load_config_file_not_found(tmp_path):
     with pytest.raises(RuntimeError) as exc:
-        load_config(["/tmp/nonexistent.yaml"])
+        load_config([str(tmp_path / "nonexistent.yaml")])
     assert "not found" in str(exc.value)
 
 
-def test_load_config_invalid_yaml():
-    fd, path = tempfile.mkstemp(suffix=".yaml")
-    with os.fdopen(fd, "w") as f:
-        f.write(": invalid yaml :")
+def test_load_config_invalid_yaml(tmp_path):
+    path = tmp_path / "invalid.yaml"
+    path.write_text(": invalid yaml :")
     with pytest.raises(RuntimeError) as exc:
-        load_config([path])
+        load_config([str(path)])
     assert "YAML syntax error" in str(exc.value)
-    os.remove(path)
 
 
-def test_load_config_invalid_root():
-    fd, path = tempfile.mkstemp(suffix=".yaml")
-    with os.fdopen(fd, "w") as f:
-        f.write("- not_a_dict\n- still_not_a_dict")
+def test_load_config_invalid_root(tmp_path):
+    path = tmp_path / "list.yaml"
+    path.write_text("- not_a_dict\n- still_not_a_dict")
     with pytest.raises(ValueError) as exc:
-        load_config([path])
+        load_config([str(path)])
     assert "must contain a dictionary" in str(exc.value)
-    os.remove(path)
@@ -52,6 +52,14 @@ def test_load_string_json_with_block():
     assert result.age == 25
 
 
+def test_load_string_json_with_inline_block():
+    """Test load_string_json with a padded code block without newlines."""
+    json_str = '  ```json{"name": "test", "age": 25}```  '
+    result = load_string_json(json_str, SampleModel)
+    assert result.name == "test"
+    assert result.age == 25
+
+
 def test_load_string_json_invalid_json():
     """Test load_string_json with invalid JSON (missing required field)."""
     with pytest.raises(ValidationError):
@@ -1,4 +1,4 @@
-import os
+import re
 
 import pytest
 from pydantic_ai.models.openai import OpenAIChatModel
@@ -7,81 +7,117 @@ from ask.core.config import LLMConfig
 from ask.core.model import create_model
 
 
-class TestCreateModelFromLLMConfig:
-    def test_openai_provider(self):
-        llm_config = LLMConfig(
-            model="openai:gpt-4o",
-            api_key="test-key",
-            base_url="https://api.openai.com/v1",
-        )
-        model = create_model(llm_config)
-        assert isinstance(model, OpenAIChatModel)
-        assert model.model_name == "gpt-4o"
-        assert model.base_url == "https://api.openai.com/v1/"
+class DummyGeminiModel:
+    def __init__(self, model_name, provider=None, settings=None):
+        self.model_name = model_name
+        self.provider = provider
+        self.settings = settings
 
-    def test_ollama_provider(self):
-        llm_config = LLMConfig(model="ollama:llama3.2", api_key=None, base_url=None)
-        model = create_model(llm_config)
-        assert isinstance(model, OpenAIChatModel)
-        assert model.model_name == "llama3.2"
-        assert model.base_url == "http://localhost:11434/v1/"
 
-    def test_openrouter_provider(self):
-        llm_config = LLMConfig(
-            model="openrouter:anthropic/claude-3.5-sonnet",
-            api_key="router-key",
-            base_url=None,
-        )
-        model = create_model(llm_config)
-        assert isinstance(model, OpenAIChatModel)
-        assert model.model_name == "anthropic/claude-3.5-sonnet"
+class DummyGoogleGLAProvider:
+    def __init__(self, api_key=None):
+        self.api_key = api_key
 
-    def test_invalid_provider(self):
-        llm_config = LLMConfig(model="invalid:model", api_key=None, base_url=None)
-        with pytest.raises(ValueError, match="Unsupported provider: invalid"):
-            create_model(llm_config)
 
-    def test_invalid_model_format(self):
-        llm_config = LLMConfig(model="gpt-4o", api_key=None, base_url=None)
-        with pytest.raises(ValueError, match="Invalid model format: gpt-4o"):
+@pytest.fixture
+def gemini_stubs(monkeypatch):
+    """Replace the Gemini model and Google GLA provider with dummies."""
+    monkeypatch.setattr("pydantic_ai.models.gemini.GeminiModel", DummyGeminiModel)
+    monkeypatch.setattr(
+        "pydantic_ai.providers.google_gla.GoogleGLAProvider", DummyGoogleGLAProvider
+    )
+    return DummyGeminiModel, DummyGoogleGLAProvider
+
+
+class TestCreateModelFromLLMConfig:
+    @pytest.mark.parametrize(
+        "model,api_key,base_url,expected_name,expected_base_url",
+        [
+            pytest.param(
+                "openai:gpt-4o",
+                "test-key",
+                "https://api.openai.com/v1",
+                "gpt-4o",
+                "https://api.openai.com/v1/",
+                id="openai",
+            ),
+            pytest.param(
+                "ollama:llama3.2",
+                None,
+                None,
+                "llama3.2",
+                "http://localhost:11434/v1/",
+                id="ollama",
+            ),
+            pytest.param(
+                "openrouter:anthropic/claude-3.5-sonnet",
+                "router-key",
+                None,
+                "anthropic/claude-3.5-sonnet",
+                None,
+                id="openrouter",
+            ),
+        ],
+    )
+    def test_openai_compatible_provider(
+        self,
+        model,
+        api_key,
+        base_url,
+        expected_name,
+        expected_base_url,
+    ):
+        created = create_model(
+            LLMConfig(model=model, api_key=api_key, base_url=base_url)
+        )
+        assert isinstance(created, OpenAIChatModel)
+        assert created.model_name == expected_name
+        if expected_base_url is not None:
+            assert created.base_url == expected_base_url
+
+    @pytest.mark.parametrize(
+        "model,api_key,message",
+        [
+            pytest.param(
+                "invalid:model", None, "Unsupported provider: invalid", id="provider"
+            ),
+            pytest.param("gpt-4o", None, "Invalid model format: gpt-4o", id="format"),
+            pytest.param(
+                "google-gemini-2.5-pro",  # missing colon
+                "google-key",
+                "Invalid model format: google-gemini-2.5-pro",
+                id="google-format",
+            ),
+            pytest.param(
+                "googlex:gemini-2.5-pro",
+                "google-key",
+                "Unsupported provider: googlex",
+                id="google-provider",
+            ),
+        ],
+    )
+    def test_invalid_model(self, model, api_key, message):
+        llm_config = LLMConfig(model=model, api_key=api_key, base_url=None)
+        with pytest.raises(ValueError, match=message):
             create_model(llm_config)
 
-    def test_api_key_from_file(self):
+    def test_api_key_from_file(self, tmp_path):
         """Test that LLMConfig reads api_key from a file."""
-        import tempfile
+        key_path = tmp_path / "key.txt"
+        key_path.write_text("my_secret_key")
+        config = LLMConfig(model="openai:gpt-4o", api_key=f"file:{key_path}")
+        assert config.api_key == "my_secret_key"
 
-        with tempfile.NamedTemporaryFile(mode="w+", delete=False) as tmp:
-            tmp.write("my_secret_key")
-            tmp_path = tmp.name
-        try:
-            config = LLMConfig(model="openai:gpt-4o", api_key=f"file:{tmp_path}")
-            assert config.api_key == "my_secret_key"
-        finally:
-            os.remove(tmp_path)
-
-    def test_api_key_from_file_not_found(self):
+    def test_api_key_from_file_not_found(self, tmp_path):
         """Test that LLMConfig raises ValueError if api_key file does not exist."""
-        fake_path = "/tmp/nonexistent_api_key_file.txt"
-        with pytest.raises(ValueError, match=f"File '{fake_path}' not found"):
+        fake_path = tmp_path / "nonexistent_api_key_file.txt"
+        message = re.escape(f"File '{fake_path}' not found")
+        with pytest.raises(ValueError, match=message):
             LLMConfig(model="openai:gpt-4o", api_key=f"file:{fake_path}")
 
-    def test_google_gemini_model(self, monkeypatch):
+    def test_google_gemini_model(self, gemini_stubs):
         """Test GeminiModel creation with Google provider."""
-
-        class DummyGeminiModel:
-            def __init__(self, model_name, provider=None, settings=None):
-                self.model_name = model_name
-                self.provider = provider
-                self.settings = settings
-
-        class DummyGoogleGLAProvider:
-            def __init__(self, api_key=None):
-                self.api_key = api_key
-
-        monkeypatch.setattr("pydantic_ai.models.gemini.GeminiModel", DummyGeminiModel)
-        monkeypatch.setattr(
-            "pydantic_ai.providers.google_gla.GoogleGLAProvider", DummyGoogleGLAProvider
-        )
+        DummyGeminiModel, DummyGoogleGLAProvider = gemini_stubs
 
         llm_config = LLMConfig(
             model="google:gemini-2.5-pro", api_key="google-key", base_url=None
@@ -91,21 +127,3 @@ class TestCreateModelFromLLMConfig:
         assert model.model_name == "gemini-2.5-pro"
         assert isinstance(model.provider, DummyGoogleGLAProvider)
         assert model.provider.api_key == "google-key"
-
-    def test_invalid_google_model_format(self):
-        llm_config = LLMConfig(
-            model="google-gemini-2.5-pro",  # missing colon
-            api_key="google-key",
-            base_url=None,
-        )
-        with pytest.raises(
-            ValueError, match="Invalid model format: google-gemini-2.5-pro"
-        ):
-            create_model(llm_config)
-
-    def test_invalid_google_provider(self):
-        llm_config = LLMConfig(
-            model="googlex:gemini-2.5-pro", api_key="google-key", base_url=None
-        )
-        with pytest.raises(ValueError, match="Unsupported provider: googlex"):
-            create_model(llm_config)
@@ -56,35 +56,22 @@ class TestCreateMCPServers:
         clients = create_mcp_servers(config)
         assert clients == []
 
-    def test_missing_url_sse(self):
+    @pytest.mark.parametrize(
+        "transport,message",
+        [
+            ("sse", "SSE transport requires 'url'"),
+            ("http", "HTTP transport requires 'url'"),
+            ("stdio", "Stdio transport requires 'command'"),
+        ],
+    )
+    def test_missing_transport_target(self, transport, message):
         config = {
-            "bad_sse": MCPServerConfig(
+            f"bad_{transport}": MCPServerConfig(
                 enabled=True,
-                transport="sse",
-                url=None,
-            )
-        }
-        with pytest.raises(ValueError, match="SSE transport requires 'url'"):
-            create_mcp_servers(config)
-
-    def test_missing_url_http(self):
-        config = {
-            "bad_http": MCPServerConfig(
-                enabled=True,
-                transport="http",
+                transport=transport,
                 url=None,
-            )
-        }
-        with pytest.raises(ValueError, match="HTTP transport requires 'url'"):
-            create_mcp_servers(config)
-
-    def test_missing_command_stdio(self):
-        config = {
-            "bad_stdio": MCPServerConfig(
-                enabled=True,
-                transport="stdio",
                 command=None,
             )
         }
-        with pytest.raises(ValueError, match="Stdio transport requires 'command'"):
+        with pytest.raises(ValueError, match=message):
             create_mcp_servers(config)
@@ -1,139 +1,133 @@
-import os
-import tempfile
+import sqlite3
+import uuid
 from datetime import datetime, timedelta
 
 import pytest
 
+from ask.core import memory_history
 from ask.core.memory_history import History
 
 
+@pytest.fixture(scope="module")
+def history_ro():
+    """Module-wide History for tests that never add entries."""
+    uri = f"file:hist_ro_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    anchor = sqlite3.connect(uri, uri=True)
+    yield History(db_path=uri)
+    anchor.close()
+
+
 @pytest.fixture
 def history():
     """Fixture to create a History instance for testing."""
-    # Use a temporary file for the database to ensure it persists across connections in a single test
-    db_fd, db_path = tempfile.mkstemp()
-    h = History(db_path=db_path)
-    yield h
-    os.close(db_fd)
-    os.unlink(db_path)
-
-
-def test_get_timestamp_now(history):
-    """Test that get_timestamp with no arguments returns the current timestamp."""
-    now = int(datetime.now().timestamp())
-    timestamp = history.get_timestamp()
-    assert timestamp >= now
-    assert timestamp - now < 2  # Allow for a small delay
-
-
-def test_get_timestamp_seconds(history):
-    """Test get_timestamp with positive and negative seconds."""
-    now = datetime.now()
-
-    # Positive seconds
-    ts_future = history.get_timestamp(seconds=30)
-    expected_future = now + timedelta(seconds=30)
-    assert abs(ts_future - int(expected_future.timestamp())) <= 1
-
-    # Negative seconds
-    ts_past = history.get_timestamp(seconds=-30)
-    expected_past = now + timedelta(seconds=-30)
-    assert abs(ts_past - int(expected_past.timestamp())) <= 1
+    # Private in-memory database; the anchor connection keeps it alive across
+    # the per-operation connections History opens during a single test
+    uri = f"file:hist_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    anchor = sqlite3.connect(uri, uri=True)
+    yield History(db_path=uri)
+    anchor.close()
 
 
-def test_get_timestamp_minutes(history):
-    """Test get_timestamp with positive and negative minutes."""
-    now = datetime.now()
+# Fixed local time so timestamp tests need no tolerance and never cross midnight
+_FROZEN_NOW = datetime(2025, 6, 15, 14, 30, 45, 123456)
 
-    # Positive minutes
-    ts_future = history.get_timestamp(minutes=15)
-    expected_future = now + timedelta(minutes=15)
-    assert abs(ts_future - int(expected_future.timestamp())) <= 1
 
-    # Negative minutes
-    ts_past = history.get_timestamp(minutes=-15)
-    expected_past = now + timedelta(minutes=-15)
-    assert abs(ts_past - int(expected_past.timestamp())) <= 1
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return _FROZEN_NOW
 
 
-def test_get_timestamp_hours(history):
-    """Test get_timestamp with positive and negative hours."""
-    now = datetime.now()
-
-    # Positive hours
-    ts_future = history.get_timestamp(hours=2)
-    expected_future = now + timedelta(hours=2)
-    assert abs(ts_future - int(expected_future.timestamp())) <= 1
-
-    # Negative hours
-    ts_past = history.get_timestamp(hours=-2)
-    expected_past = now + timedelta(hours=-2)
-    assert abs(ts_past - int(expected_past.timestamp())) <= 1
+@pytest.fixture
+def frozen_now(monkeypatch) -> datetime:
+    """Freeze the clock History reads and return the frozen time."""
+    monkeypatch.setattr(memory_history, "datetime", _FrozenDatetime)
+    return _FROZEN_NOW
 
 
-def test_get_timestamp_days(history):
+def test_get_timestamp_now(history_ro, frozen_now):
+    """Test that get_timestamp with no arguments returns the current timestamp."""
+    assert history_ro.get_timestamp() == int(frozen_now.timestamp())
+
+
+@pytest.mark.parametrize(
+    "kwargs,delta",
+    [
+        pytest.param({"seconds": 30}, timedelta(seconds=30), id="seconds+"),
+        pytest.param({"seconds": -30}, timedelta(seconds=-30), id="seconds-"),
+        pytest.param({"minutes": 15}, timedelta(minutes=15), id="minutes+"),
+        pytest.param({"minutes": -15}, timedelta(minutes=-15), id="minutes-"),
+        pytest.param({"hours": 2}, timedelta(hours=2), id="hours+"),
+        pytest.param({"hours": -2}, timedelta(hours=-2), id="hours-"),
+    ],
+)
+def test_get_timestamp_offset(history_ro, frozen_now, kwargs, delta):
+    """Test get_timestamp with positive and negative seconds, minutes and hours."""
+    expected = frozen_now + delta
+    assert history_ro.get_timestamp(**kwargs) == int(expected.timestamp())
+
+
+def test_get_timestamp_days(history_ro, frozen_now):
     """Test get_timestamp with days, which should be relative to midnight."""
-    now = datetime.now()
+    now = frozen_now
     midnight_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
     # 1 day in the future (tomorrow at midnight)
-    ts_tomorrow = history.get_timestamp(days=1)
+    ts_tomorrow = history_ro.get_timestamp(days=1)
     expected_tomorrow = midnight_today + timedelta(days=1 + 1)
     assert ts_tomorrow == int(expected_tomorrow.timestamp())
 
     # -1 day in the past (yesterday at midnight)
-    ts_yesterday = history.get_timestamp(days=-1)
+    ts_yesterday = history_ro.get_timestamp(days=-1)
     expected_yesterday = midnight_today + timedelta(days=-1 + 1)
     assert ts_yesterday == int(expected_yesterday.timestamp())
 
     # 0 days should be today at the current time, not midnight
-    ts_today = history.get_timestamp(days=0)
-    assert abs(ts_today - int(now.timestamp())) <= 1
+    ts_today = history_ro.get_timestamp(days=0)
+    assert ts_today == int(now.timestamp())
 
 
-def test_get_timestamp_months(history):
+def test_get_timestamp_months(history_ro, frozen_now):
     """Test get_timestamp with months, which should be relative to midnight."""
-    now = datetime.now()
+    now = frozen_now
     midnight_first_of_month = now.replace(
         day=1, hour=0, minute=0, second=0, microsecond=0
     )
 
     # 1 month in the future
-    ts_next_month = history.get_timestamp(months=1)
+    ts_next_month = history_ro.get_timestamp(months=1)
     expected_next_month = midnight_first_of_month + timedelta(days=30 * (1 + 1))
     assert ts_next_month == int(expected_next_month.timestamp())
 
     # -1 month in the past
-    ts_last_month = history.get_timestamp(months=-1)
+    ts_last_month = history_ro.get_timestamp(months=-1)
     expected_last_month = midnight_first_of_month + timedelta(days=30 * (-1 + 1))
     assert ts_last_month == int(expected_last_month.timestamp())
 
 
-def test_get_timestamp_combined(history):
+def test_get_timestamp_combined(history_ro, frozen_now):
     """Test get_timestamp with a combination of parameters."""
-    now = datetime.now()
+    now = frozen_now
     midnight_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
     # Test with days and hours
-    ts = history.get_timestamp(days=1, hours=5)
+    ts = history_ro.get_timestamp(days=1, hours=5)
     expected = midnight_today + timedelta(days=1 + 1, hours=5)
     assert ts == int(expected.timestamp())
 
 
-def test_get_page_empty(history):
+def test_get_page_empty(history_ro):
     """Test get_page with no entries in the history."""
-    assert history.get_page() == []
+    assert history_ro.get_page() == []
 
 
 def test_get_page_pagination(history):
     """Test pagination of get_page."""
-    timestamps = []
-    for i in range(25):
-        # Ensure timestamps are unique and ordered
-        ts = int((datetime.now() - timedelta(seconds=i * 2)).timestamp())
-        history.add_history(f"query {i}", f"content {i}", timestamp=ts)
-        timestamps.append(ts)
-    timestamps.sort(reverse=True)  # Newest first
+    base = int(datetime.now().timestamp())
+    # Ensure timestamps are unique and ordered
+    rows = [(f"query {i}", f"content {i}", base - i * 2) for i in range(25)]
+    assert history.add_history_many(rows) == 25
+    timestamps = sorted((ts for _, _, ts in rows), reverse=True)  # Newest first
 
     # Test page 1
     page1 = history.get_page(page=1, page_size=10)
@@ -163,11 +157,10 @@ def test_get_page_pagination(history):
 
 def test_get_page_ordering(history):
     """Test 'asc' and 'desc' ordering of get_page."""
-    timestamps = []
-    for i in range(5):
-        ts = int((datetime.now() - timedelta(seconds=i * 2)).timestamp())
-        history.add_history(f"query {i}", f"content {i}", timestamp=ts)
-        timestamps.append(ts)
+    base = int(datetime.now().timestamp())
+    history.add_history_many(
+        (f"query {i}", f"content {i}", base - i * 2) for i in range(5)
+    )
 
     # Test descending order (default)
     desc_entries = history.get_page(order="desc")
@@ -185,13 +178,13 @@ def test_get_page_ordering(history):
 def test_get_page_before_filter(history):
     """Test the 'before' timestamp filter of get_page."""
     base_time = datetime.now()
-    history.add_history(
-        "query 1", "content 1", int((base_time - timedelta(days=2)).timestamp())
+    history.add_history_many(
+        [
+            ("query 1", "content 1", int((base_time - timedelta(days=2)).timestamp())),
+            ("query 2", "content 2", int((base_time - timedelta(days=1)).timestamp())),
+            ("query 3", "content 3", int(base_time.timestamp())),
+        ]
     )
-    history.add_history(
-        "query 2", "content 2", int((base_time - timedelta(days=1)).timestamp())
-    )
-    history.add_history("query 3", "content 3", int(base_time.timestamp()))
 
     # Filter to get entries before 1.5 days ago
     before_ts = int((base_time - timedelta(days=1, hours=12)).timestamp())
@@ -200,13 +193,27 @@ def test_get_page_before_filter(history):
     assert entries[0].query == "query 1"
 
 
-def test_get_page_invalid_args(history):
+def test_get_page_invalid_args(history_ro):
     """Test that get_page raises ValueError for invalid arguments."""
     with pytest.raises(ValueError, match="Page must be >= 1"):
-        history.get_page(page=0)
+        history_ro.get_page(page=0)
 
     with pytest.raises(ValueError, match="Page size must be between 1 and 100"):
-        history.get_page(page_size=0)
+        history_ro.get_page(page_size=0)
 
     with pytest.raises(ValueError, match="Page size must be between 1 and 100"):
-        history.get_page(page_size=101)
+        history_ro.get_page(page_size=101)
+
+
+def test_add_history_many_matches_add_history(history):
+    """Test that batch inserts are stored like single inserts."""
+    single_id = history.add_history("single", "content", timestamp=100)
+    assert history.add_history_many([("batch", "content", 200)]) == 1
+
+    entries = history.get_page(order="asc")
+    assert [(e.query, e.timestamp) for e in entries] == [
+        ("single", 100),
+        ("batch", 200),
+    ]
+    assert entries[0].id == single_id
+    assert entries[1].id > single_id